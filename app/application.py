@@ -1,9 +1,11 @@
 # app.py (或者 application.py)
 from dotenv import load_dotenv
 from datetime import datetime
+import logging
 import os
 import re  # <-- 【修改1】确保导入 re 模块
-from flask import Flask, render_template, request, session, redirect, url_for
+import json
+from flask import Flask, render_template, request, session, redirect, url_for, Response, stream_with_context
 from markupsafe import Markup
 from flask_cors import CORS
 
@@ -11,8 +13,15 @@ from flask_cors import CORS
 from langchain_core.messages import HumanMessage, AIMessage
 
 # 导入你自己的模块
-from app.components.retriever import create_qa_chain
-from app.common.logger import get_logger
+from app.components.retriever import create_qa_chain, answer_question
+from app.components.batch_qa import load_questions, retrieve_batch, run_batch
+from app.components.llm import condense_hedger, answer_hedger
+from app.common.logger import get_logger, get_dropped_log_count
+from app.common.memory import get_server_memory_report
+from app.common.tracing import Trace
+from app.common.coalescing import RequestCoalescer, normalize_question
+from app.common.custom_exception import CustomException
+from app.config.config import BATCH_CONCURRENCY, COALESCE_ENABLED
 
 # --- 准备工作 ---
 load_dotenv()
@@ -44,6 +53,9 @@ if qa_chain:
 else:
     logger.error("FATAL: Could not load QA chain. The application might not work correctly.")
 
+# 合并同一时刻到达的相同问题 (仅限没有对话历史的提问，带历史的回答依赖上下文，不能共享)
+coalescer = RequestCoalescer()
+
 # --- API 路由 (这部分代码保持不变) ---
 @app.route("/", methods=["GET", "POST"])
 def index():
@@ -67,11 +79,21 @@ def index():
             
             try:
                 if qa_chain:
-                    logger.info("Invoking conversational chain with history...")
-                    response = qa_chain.invoke({
-                        "question": user_input,
-                        "chat_history": formatted_chat_history
-                    })
+                    with Trace("chat_turn") as trace:
+                        if COALESCE_ENABLED and not formatted_chat_history:
+                            logger.info("Invoking conversational chain without history (coalescing)...")
+                            response, leader_id = coalescer.run(
+                                normalize_question(user_input),
+                                lambda: answer_question(qa_chain, user_input, formatted_chat_history, trace),
+                                trace.request_id,
+                            )
+                            # 被合并的请求没有自己的 span，记录领头请求的 ID，以便在日志中找到对应的 trace
+                            trace.set("coalesced", leader_id is not None)
+                            if leader_id is not None:
+                                trace.set("coalesced_with", leader_id)
+                        else:
+                            logger.info("Invoking conversational chain with history...")
+                            response = answer_question(qa_chain, user_input, formatted_chat_history, trace)
                     result = response.get("answer", "抱歉，处理时遇到错误。")
                 else:
                     result = "错误: 问答系统未初始化。"
@@ -95,6 +117,42 @@ def clear():
     return redirect(url_for("index"))
 
 
+@app.route("/batch", methods=["POST"])
+def batch():
+    """
+    批量问答端点：上传一个 JSONL 文件 (表单字段 file) 或直接把 JSONL 作为请求体发送，
+    按完成顺序以 application/x-ndjson 流式返回每条结果。可选查询参数 concurrency。
+    """
+    if not qa_chain:
+        return {'error': '问答系统未初始化。'}, 503
+
+    upload = request.files.get("file")
+    lines = upload.stream.read().splitlines() if upload else request.get_data().splitlines()
+    try:
+        items = load_questions(lines)
+    except CustomException as e:
+        return {'error': str(e)}, 400
+    if not items:
+        return {'error': 'No questions found in request.'}, 400
+
+    concurrency = request.args.get("concurrency", BATCH_CONCURRENCY, type=int)
+    logger.info(f"Batch request received with {len(items)} questions.")
+
+    # 在返回流式响应之前完成嵌入和检索，这样出错时还能返回 500，而不是一个被截断的响应体
+    try:
+        retrieval = retrieve_batch(qa_chain, items)
+    except Exception as e:
+        error_message = CustomException("Batch retrieval failed", e)
+        logger.error(str(error_message))
+        return {'error': f'Batch retrieval failed: {str(e)}'}, 500
+
+    def generate():
+        for result in run_batch(qa_chain, items, concurrency, retrieval=retrieval):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
 @app.route("/health")
 def health_check():
     """健康检查端点 - 增强版本"""
@@ -110,13 +168,18 @@ def health_check():
         vectorstore_exists = os.path.exists(VECTORSTORE_PATH)
         qa_chain_ready = qa_chain is not None
         
-        # 更详细的日志记录
-        logger.info(f"Health check - Model exists: {model_exists}")
-        logger.info(f"Health check - Vectorstore exists: {vectorstore_exists}")  
-        logger.info(f"Health check - QA chain ready: {qa_chain_ready}")
+        healthy = all([model_exists, vectorstore_exists, qa_chain_ready])
+
+        # 健康检查是高频探针：合并为一行并按 LOG_SAMPLE_RATES["health"] 采样；不健康时以 WARNING 级别始终记录
+        logger.log(
+            logging.INFO if healthy else logging.WARNING,
+            f"Health check - Model exists: {model_exists}, "
+            f"Vectorstore exists: {vectorstore_exists}, QA chain ready: {qa_chain_ready}",
+            extra={"sample": "health"},
+        )
         
         status = {
-            'status': 'healthy' if all([model_exists, vectorstore_exists, qa_chain_ready]) else 'unhealthy',
+            'status': 'healthy' if healthy else 'unhealthy',
             'model_loaded': model_exists,
             'vectorstore_loaded': vectorstore_exists,
             'qa_chain_ready': qa_chain_ready,
@@ -131,7 +194,30 @@ def health_check():
         logger.error(f"Health check failed: {str(e)}")
         return {'status': 'error', 'error': str(e)}, 503
 
+
+@app.route("/health/memory")
+def memory_report():
+    """报告 master 和各个 worker 的 RSS / 共享内存，用来确认模型和向量库在 worker 之间是共享的。"""
+    report = get_server_memory_report()
+    if report["master"] is None:
+        return {'status': 'error', 'error': 'Memory statistics unavailable on this platform.'}, 503
+    return report, 200
+
+@app.route("/metrics")
+def metrics():
+    """当前 worker 进程的请求合并、LLM 对冲计数，以及因日志队列已满而丢弃的日志条数。"""
+    return {
+        'pid': os.getpid(),
+        'dropped_log_records': get_dropped_log_count(),
+        'coalescing': coalescer.stats(),
+        'hedging': {
+            hedger.name: hedger.stats() for hedger in (condense_hedger, answer_hedger) if hedger
+        } or None,
+    }, 200
+
+
 if __name__ == "__main__":
+    # 开发模式：Flask 自带的单进程服务器。生产环境请使用 gunicorn.conf.py (preload + 多 worker)
     # 【关键修复】根据环境变量决定是否启用 debug 模式
     debug_mode = os.getenv('FLASK_DEBUG', 'False').lower() in ['true', '1', 'yes']
     logger.info(f"Starting Flask app with debug mode: {debug_mode}")
@@ -0,0 +1,70 @@
+# app/common/coalescing.py
+# 合并同时进行的相同请求：同一个 key 在执行期间，后到的请求不再重复执行，而是等待并共享第一个请求的结果。
+
+import re
+import threading
+import unicodedata
+from concurrent.futures import Future
+
+# 问题末尾不影响语义的标点 (中英文)
+_TRAILING_PUNCTUATION = "?？!！.。,，;；~～ "
+
+
+def normalize_question(question):
+    """把问题规范化为合并用的 key：全角转半角、去首尾空白、合并连续空白、转小写、去掉末尾标点。"""
+    text = unicodedata.normalize("NFKC", question)
+    text = re.sub(r"\s+", " ", text).strip().lower()
+    return text.rstrip(_TRAILING_PUNCTUATION)
+
+
+class RequestCoalescer:
+    """
+    线程安全的请求合并器 (single-flight)。
+    run(key, fn, request_id) 返回 (结果, 领头请求的 request_id)：同一时刻相同 key 只有第一个调用会执行 fn，
+    其余调用阻塞等待并拿到同一个结果 (或同一个异常)。第二个返回值对领头请求本身为 None，
+    对被合并的请求是执行 fn 的那个请求的 request_id，方便在日志里找到真正执行的那条 trace。
+    执行结束后 key 立即释放，不做缓存。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # key -> (Future, 领头请求的 request_id)
+        self._inflight = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def run(self, key, fn, request_id):
+        with self._lock:
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                future = Future()
+                self._inflight[key] = (future, request_id)
+                self.executed += 1
+                is_leader = True
+            else:
+                future, leader_id = inflight
+                self.coalesced += 1
+                is_leader = False
+
+        if not is_leader:
+            return future.result(), leader_id
+
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, None
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "executed": self.executed,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._inflight),
+            }
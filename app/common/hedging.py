@@ -0,0 +1,147 @@
+# app/common/hedging.py
+# 对冲请求 (hedged requests)：如果一次上游调用的耗时超过了最近调用延迟的某个百分位，
+# 就再发一个相同的请求，两者谁先返回用谁，另一个立即取消。
+# 对冲次数受令牌桶预算限制，避免在上游整体变慢时把请求量翻倍。
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+
+from app.common.logger import get_logger
+
+logger = get_logger(__name__)
+
+_loop_lock = threading.Lock()
+_loop = None
+_loop_pid = None
+
+
+def _get_event_loop():
+    """返回一个在后台线程中常驻运行的事件循环 (每个进程一个；fork 出的 worker 会重新创建)。"""
+    global _loop, _loop_pid
+    with _loop_lock:
+        if _loop is None or _loop_pid != os.getpid():
+            _loop = asyncio.new_event_loop()
+            _loop_pid = os.getpid()
+            threading.Thread(target=_loop.run_forever, name="hedging-loop", daemon=True).start()
+        return _loop
+
+
+class Hedger:
+    """
+    run(make_coro) 在后台事件循环里执行 make_coro() 创建的协程，并在需要时发起对冲请求，
+    返回 (结果, {"hedged": 是否发起了对冲, "hedge_won": 是否由对冲请求胜出})。
+    make_coro 每调用一次必须创建一个新的、独立的上游请求。
+    每个 Hedger 只应该用于一种上游调用 (例如同一条链)，否则延迟分布会被不同调用混在一起。
+
+    - percentile:   主请求超过最近延迟的该百分位仍未返回时发起对冲
+    - min_samples:  收集到这么多次延迟样本之前不做对冲
+    - budget_ratio: 每次调用向预算中增加的令牌数 (0.1 表示最多增加约 10% 的上游请求)
+    - budget_burst: 预算令牌上限，允许短时间内集中对冲的次数
+    """
+
+    def __init__(self, name, percentile=95, min_samples=20, window=200, budget_ratio=0.1, budget_burst=5):
+        self.name = name
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.budget_ratio = budget_ratio
+        self.budget_burst = budget_burst
+        self._latencies = deque(maxlen=window)
+        self._tokens = float(budget_burst)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.budget_exhausted = 0
+
+    def run(self, make_coro):
+        # 协程在事件循环线程里执行，不会继承调用线程的 contextvars (例如 request_id)，
+        # 所以在这里复制一份，进入 _run 后再还原
+        context = contextvars.copy_context()
+        future = asyncio.run_coroutine_threadsafe(self._run(make_coro, context), _get_event_loop())
+        return future.result()
+
+    def hedge_delay(self):
+        """当前的对冲触发延迟 (秒)；样本不足时返回 None，表示不对冲。"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return ordered[index]
+
+    def stats(self):
+        delay = self.hedge_delay()
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hedged": self.hedged,
+                "hedge_wins": self.hedge_wins,
+                "budget_exhausted": self.budget_exhausted,
+                "budget_tokens": round(self._tokens, 2),
+                "hedge_delay_ms": round(delay * 1000, 1) if delay is not None else None,
+            }
+
+    def _record_call(self):
+        with self._lock:
+            self.calls += 1
+            self._tokens = min(self.budget_burst, self._tokens + self.budget_ratio)
+
+    def _try_acquire_budget(self):
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self.hedged += 1
+                return True
+            self.budget_exhausted += 1
+            return False
+
+    def _record_latency(self, seconds):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    async def _run(self, make_coro, context):
+        for var, value in context.items():
+            var.set(value)
+
+        self._record_call()
+        delay = self.hedge_delay()
+        started = time.perf_counter()
+        primary = asyncio.ensure_future(make_coro())
+        hedge_info = {"hedged": False, "hedge_won": False}
+
+        done = set()
+        if delay is not None:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        if delay is None or done or not self._try_acquire_budget():
+            result = await primary
+            self._record_latency(time.perf_counter() - started)
+            return result, hedge_info
+
+        logger.info(
+            f"{self.name} call exceeded p{self.percentile} ({delay * 1000:.0f}ms), sending hedged request"
+        )
+        hedge_info["hedged"] = True
+        hedge = asyncio.ensure_future(make_coro())
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        # 记录的是从主请求发出到拿到结果的耗时，而不是胜出请求自身的耗时，
+                        # 否则每次对冲都会把百分位拉低
+                        self._record_latency(time.perf_counter() - started)
+                        if task is hedge:
+                            hedge_info["hedge_won"] = True
+                            with self._lock:
+                                self.hedge_wins += 1
+                        return task.result(), hedge_info
+            # 两个请求都失败了：抛出主请求的异常
+            return primary.result(), hedge_info
+        finally:
+            for task in pending:
+                task.cancel()
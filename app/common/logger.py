@@ -1,48 +1,338 @@
 # app/common/logger.py
 
+import atexit
+import copy
+import itertools
+import json
 import logging
-import sys
+import logging.handlers
 import os
+import queue
+import re
+import sys
+import threading
+import time
+from contextvars import ContextVar
 from datetime import datetime
 
+from app.config.config import (
+    LOG_DIR,
+    LOG_LEVEL,
+    LOG_MAX_BYTES,
+    LOG_BACKUP_COUNT,
+    LOG_QUEUE_SIZE,
+    LOG_SAMPLE_RATES,
+    LOG_CONFIG_WARNINGS,
+)
+
+# 当前请求的 ID，由 app.common.tracing.Trace 设置，会自动附加到这个请求期间的每一条日志上
+request_id_var = ContextVar("request_id", default=None)
+
+TEXT_FORMAT = "%(asctime)s - %(levelname)s - [%(name)s] - %(message)s"
+
+# LogRecord 自带的属性，JSON 输出时只额外保留通过 extra= 传入的字段
+_RESERVED_ATTRS = set(logging.LogRecord("", 0, "", 0, "", (), None).__dict__) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """把日志记录格式化为一行 JSON，方便用 jq 或日志平台检索。"""
+
+    def format(self, record):
+        payload = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "pid": record.process,
+            "thread": record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and key not in payload:
+                payload[key] = value
+        # 异常堆栈单独成一个字段，不混在 message 里 (exc_text 由 NonBlockingQueueHandler.prepare 生成)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload["exception"] = record.exc_text
+        if record.stack_info:
+            payload["stack_info"] = record.stack_info
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class SizedTimedRotatingFileHandler(logging.handlers.TimedRotatingFileHandler):
+    """
+    每天午夜轮转，同时在单个文件超过 max_bytes 时提前轮转。
+    同一天内因大小轮转出的文件与 RotatingFileHandler 一样依次后移：
+    最新的是 app.log.<日期>.1，更早的是 .2、.3 ...；午夜轮转出的 app.log.<日期> 是当天最后一份。
+    清理旧文件时按 (日期, 序号) 排序，而不是按文件名字符串排序。
+    """
+
+    def __init__(self, filename, max_bytes=0, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.max_bytes = max_bytes
+        self._size_rollover = False
+        self._backup_pattern = re.compile(
+            re.escape(os.path.basename(self.baseFilename)) + r"\.(\d{4}-\d{2}-\d{2})(?:\.(\d+))?$"
+        )
+
+    def shouldRollover(self, record):
+        if super().shouldRollover(record):
+            self._size_rollover = False
+            return True
+        if self.max_bytes > 0:
+            if self.stream is None:
+                self.stream = self._open()
+            msg = f"{self.format(record)}\n"
+            if self.stream.tell() + len(msg) >= self.max_bytes:
+                self._size_rollover = True
+                return True
+        return False
+
+    def doRollover(self):
+        if not self._size_rollover:
+            return super().doRollover()
+
+        self._size_rollover = False
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+        date_suffix = time.strftime(self.suffix, time.localtime(self.rolloverAt - self.interval))
+        prefix = f"{self.baseFilename}.{date_suffix}"
+
+        # 把当天已有的 .N 依次改名为 .N+1，再把当前文件轮转为 .1
+        indexes = sorted(
+            (index for date, index in self._list_backups().values() if date == date_suffix and index > 0),
+            reverse=True,
+        )
+        for index in indexes:
+            os.rename(f"{prefix}.{index}", f"{prefix}.{index + 1}")
+        self.rotate(self.baseFilename, f"{prefix}.1")
+
+        if self.backupCount > 0:
+            for old_file in self.getFilesToDelete():
+                os.remove(old_file)
+        if not self.delay:
+            self.stream = self._open()
+
+    def getFilesToDelete(self):
+        backups = self._list_backups()
+        if len(backups) <= self.backupCount:
+            return []
+
+        def age_key(path):
+            # 从旧到新：日期越早越旧；同一天内序号越大越旧，午夜轮转出的无序号文件最新
+            date, index = backups[path]
+            return date, -index if index else 1
+
+        ordered = sorted(backups, key=age_key)
+        return ordered[:len(ordered) - self.backupCount]
+
+    def _list_backups(self):
+        """返回 {路径: (日期, 序号)}，午夜轮转出的文件序号为 0。"""
+        dir_name = os.path.dirname(self.baseFilename)
+        backups = {}
+        for file_name in os.listdir(dir_name):
+            match = self._backup_pattern.match(file_name)
+            if match:
+                backups[os.path.join(dir_name, file_name)] = (match.group(1), int(match.group(2) or 0))
+        return backups
+
+
+class SamplingFilter(logging.Filter):
+    """
+    对高频事件做采样：带有 extra={"sample": "<key>"} 的记录，每 LOG_SAMPLE_RATES[key] 条只保留 1 条。
+    WARNING 及以上级别的记录始终保留。
+    """
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+        self._counters = {key: itertools.count() for key in rates}
+
+    def filter(self, record):
+        key = getattr(record, "sample", None)
+        if key is None or record.levelno >= logging.WARNING or key not in self.rates:
+            return True
+        # itertools.count 的 next() 在 CPython 中是原子操作，不需要额外加锁
+        return next(self._counters[key]) % self.rates[key] == 0
+
+
+class RequestIdFilter(logging.Filter):
+    """在调用线程里把当前请求 ID 写入日志记录 (必须在进入队列之前执行)。"""
+
+    def filter(self, record):
+        if not hasattr(record, "request_id"):
+            request_id = request_id_var.get()
+            if request_id is not None:
+                record.request_id = request_id
+        return True
+
+
+_exception_formatter = logging.Formatter()
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """队列满时直接丢弃日志并计数，保证日志调用永远不会阻塞请求线程。"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # 默认的 prepare 会把异常堆栈格式化进 msg；这里只合并 msg 和 args，
+        # 把堆栈单独存到 exc_text，让后台线程里的格式化器决定如何输出 (JSON 中是独立字段)。
+        # exc_info 里的 traceback 对象不能跨线程保留，所以放入队列前丢掉。
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        record.message = record.msg
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_setup_lock = threading.Lock()
+_queue_handler = None
+_listener = None
+_console_stream = None
+
+
+def _build_handlers(log_file_name):
+    console_handler = logging.StreamHandler(_console_stream or sys.stdout)
+    console_handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+    os.makedirs(LOG_DIR, exist_ok=True)
+    file_handler = SizedTimedRotatingFileHandler(
+        os.path.join(LOG_DIR, log_file_name),
+        max_bytes=LOG_MAX_BYTES,
+        when="midnight",
+        backupCount=LOG_BACKUP_COUNT,
+        encoding="utf-8",
+        delay=True,
+    )
+    file_handler.setFormatter(JsonFormatter())
+    return console_handler, file_handler
+
+
+def _start_listener(handlers):
+    global _listener
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _queue_handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+
+def _stop_listener():
+    if _listener is not None:
+        _listener.stop()
+
+
+def set_console_stream(stream):
+    """
+    修改控制台日志的输出流 (默认 stdout)。
+    命令行工具把结果写到 stdout 时应改为 sys.stderr，避免后台线程写的日志混进结果里。
+    """
+    global _console_stream
+    _console_stream = stream
+    if _listener is None:
+        return
+    for handler in _listener.handlers:
+        if type(handler) is logging.StreamHandler:
+            handler.setStream(stream)
+
+
+_worker_slot_file = None
+
+
+def _claim_worker_slot():
+    """
+    为当前 worker 领取一个稳定的编号：依次尝试对 logs/.worker-<n>.lock 加非阻塞文件锁，
+    第一个成功的 n 就是本进程的编号。进程退出后锁自动释放，重启的 worker 会复用同一个编号，
+    所以 worker 日志文件的数量不会超过同时存在的 worker 数量。
+    """
+    import fcntl
+
+    global _worker_slot_file
+    # 从父进程继承来的锁文件只属于父进程
+    if _worker_slot_file is not None:
+        _worker_slot_file.close()
+        _worker_slot_file = None
+
+    slot = 0
+    while True:
+        lock_file = open(os.path.join(LOG_DIR, f".worker-{slot}.lock"), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            slot += 1
+            continue
+        _worker_slot_file = lock_file
+        return slot
+
+
+def _reinit_after_fork():
+    # 监听线程不会被 fork 到子进程里：在子进程中换一个新队列并重新启动监听线程。
+    # 每个 worker 写自己的日志文件 (app.worker-<编号>.log)，避免多个进程同时轮转同一个文件导致日志丢失。
+    if _listener is None:
+        return
+    for handler in _listener.handlers:
+        if isinstance(handler, logging.FileHandler) and handler.stream:
+            handler.stream.close()
+    os.makedirs(LOG_DIR, exist_ok=True)
+    _queue_handler.dropped = 0
+    _start_listener(_build_handlers(f"app.worker-{_claim_worker_slot()}.log"))
+
+
+def _setup_logging():
+    """只执行一次：创建共享的队列处理器，真正的输出 (控制台 + 文件) 在后台线程中完成。"""
+    global _queue_handler
+    with _setup_lock:
+        if _queue_handler is not None:
+            return _queue_handler
+
+        _queue_handler = NonBlockingQueueHandler(None)
+        _queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATES))
+        _queue_handler.addFilter(RequestIdFilter())
+        _start_listener(_build_handlers("app.log"))
+
+        atexit.register(_stop_listener)
+        # os.register_at_fork 只在 Unix 上可用 (Windows 不会 fork)
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=_reinit_after_fork)
+
+        config_logger = logging.getLogger(__name__)
+        config_logger.addHandler(_queue_handler)
+        for warning in LOG_CONFIG_WARNINGS:
+            config_logger.warning(warning)
+        return _queue_handler
+
+
+def get_dropped_log_count():
+    """返回当前进程因队列已满而丢弃的日志条数。"""
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
 def get_logger(name: str = "RAG_MEDICAL_CHATBOT_LOGGER"):
     """
     配置并返回一个日志记录器。
-    这个版本会同时将日志输出到控制台和按日期命名的日志文件中，
-    并确保中文在两个地方都能正确显示。
+    日志调用只是把记录放进内存队列，控制台输出和 JSON 文件写入由后台线程完成，
+    不会在请求路径上阻塞磁盘 I/O。文件 logs/app.log 每天午夜及超过 LOG_MAX_BYTES 时轮转。
     """
-    # 获取 logger 实例
     logger = logging.getLogger(name)
-    
-    # --- 关键修改 ---
+
     # 检查 logger 是否已经有处理器，如果没有，才进行配置。
     # 这可以防止因重复调用而导致日志打印多次。
     if not logger.handlers:
-        logger.setLevel(logging.INFO)
-        
-        # 创建一个统一的日志格式
-        formatter = logging.Formatter(
-            "%(asctime)s - %(levelname)s - [%(name)s] - %(message)s"
-        )
+        logger.setLevel(LOG_LEVEL)
+        logger.addHandler(_setup_logging())
 
-        # --- 处理器1: 输出到控制台 (解决乱码问题) ---
-        console_handler = logging.StreamHandler(sys.stdout)
-        # StreamHandler 默认会使用系统编码，我们在这里依赖 Python 3 的默认 UTF-8 处理能力
-        console_handler.setFormatter(formatter)
-        logger.addHandler(console_handler)
-
-        # --- 处理器2: 输出到文件 (您的原有功能) ---
-        # 创建 logs 目录 (如果不存在)
-        logs_dir = "logs"
-        os.makedirs(logs_dir, exist_ok=True)
-
-        # 按日期创建日志文件
-        log_file_path = os.path.join(logs_dir, f"log_{datetime.now().strftime('%Y-%m-%d')}.log")
-        
-        # 创建文件处理器，并明确指定使用 utf-8 编码
-        file_handler = logging.FileHandler(log_file_path, encoding='utf-8')
-        file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
-        
     return logger
-
@@ -0,0 +1,105 @@
+# app/common/memory.py
+# 读取 /proc 下的内存统计，用来确认 preload + fork 模式下各个 worker 是否真的共享了模型和向量库的内存页。
+
+import os
+
+# smaps_rollup 中我们关心的字段 (单位 kB)
+_SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+
+def get_process_memory(pid=None):
+    """
+    返回某个进程的内存使用情况 (单位 MB)：rss、pss、shared、private。
+    优先读取 /proc/<pid>/smaps_rollup；内核不支持时退回 /proc/<pid>/status 里的 VmRSS / RssFile / RssShmem。
+    """
+    pid = pid or os.getpid()
+    values = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in _SMAPS_FIELDS:
+                    values[key] = int(rest.split()[0])
+    except OSError:
+        values = {}
+
+    if values:
+        shared_kb = values.get("Shared_Clean", 0) + values.get("Shared_Dirty", 0)
+        private_kb = values.get("Private_Clean", 0) + values.get("Private_Dirty", 0)
+        rss_kb, pss_kb = values.get("Rss", 0), values.get("Pss", 0)
+    else:
+        status = _read_status(pid)
+        if not status:
+            return None
+        rss_kb = status.get("VmRSS", 0)
+        shared_kb = status.get("RssFile", 0) + status.get("RssShmem", 0)
+        private_kb = status.get("RssAnon", rss_kb - shared_kb)
+        pss_kb = None
+
+    return {
+        "pid": pid,
+        "rss_mb": _to_mb(rss_kb),
+        "pss_mb": _to_mb(pss_kb) if pss_kb is not None else None,
+        "shared_mb": _to_mb(shared_kb),
+        "private_mb": _to_mb(private_kb),
+    }
+
+
+def get_child_pids(pid):
+    """返回某个进程的所有直接子进程 pid (即 gunicorn master 下的 worker)。"""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        pass
+
+    # 内核没有开启 CONFIG_PROC_CHILDREN 时，扫描 /proc 找父进程为 pid 的进程
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # comm 字段可能包含空格，所以从最后一个 ')' 之后开始解析
+                fields = f.read().rsplit(")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        if int(fields[1]) == pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def get_server_memory_report():
+    """
+    汇总 master 和所有 worker 的内存使用情况。
+    在 gunicorn 下运行时 (SERVER_MASTER_PID 由 gunicorn.conf.py 设置) 报告 master 及其全部 worker；
+    否则只报告当前进程。
+    """
+    master_pid = os.environ.get("SERVER_MASTER_PID")
+    if not master_pid:
+        return {"master": get_process_memory(), "workers": []}
+
+    master_pid = int(master_pid)
+    workers = [get_process_memory(pid) for pid in get_child_pids(master_pid)]
+    return {
+        "master": get_process_memory(master_pid),
+        "workers": [w for w in workers if w is not None],
+        "current_pid": os.getpid(),
+    }
+
+
+def _read_status(pid):
+    values = {}
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                key, _, rest = line.partition(":")
+                if rest.strip().endswith("kB"):
+                    values[key] = int(rest.split()[0])
+    except OSError:
+        return None
+    return values
+
+
+def _to_mb(kb):
+    return round(kb / 1024, 1)
@@ -0,0 +1,82 @@
+# app/common/tracing.py
+# 为每一轮对话分配一个请求 ID，并记录各个步骤 (condense / embed / search / answer) 的耗时。
+# 整个请求结束时只写一条结构化日志，方便从日志里定位慢请求。
+
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from app.common.logger import get_logger, request_id_var
+
+logger = get_logger(__name__)
+
+# 当前请求的 Trace，让调用链深处的代码 (例如 LLM 对冲) 不需要层层传参也能记录信息
+_current_trace_var = ContextVar("current_trace", default=None)
+
+
+def get_current_trace():
+    """返回当前请求的 Trace；不在 Trace 中时返回 None。"""
+    return _current_trace_var.get()
+
+
+class Trace:
+    """
+    用法：
+        with Trace("chat_turn") as trace:
+            with trace.span("embed"):
+                ...
+    进入 with 块时设置当前请求 ID (期间所有日志都会带上 request_id)，
+    退出时记录一条包含全部 span 耗时的日志。
+    """
+
+    def __init__(self, name, request_id=None):
+        self.name = name
+        self.request_id = request_id or uuid.uuid4().hex[:16]
+        self.spans = []
+        self.attributes = {}
+        self._start = None
+        self._token = None
+        self._trace_token = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        self._token = request_id_var.set(self.request_id)
+        self._trace_token = _current_trace_var.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        total_ms = round((time.perf_counter() - self._start) * 1000, 1)
+        record = {
+            "name": self.name,
+            "total_ms": total_ms,
+            "spans": self.spans,
+            "status": "error" if exc_type else "ok",
+            **self.attributes,
+        }
+        if exc_type:
+            record["error"] = repr(exc)
+
+        summary = " ".join(f"{span['name']}={span['duration_ms']}ms" for span in self.spans)
+        logger.info(f"Trace {self.name} total={total_ms}ms {summary}", extra={"trace": record})
+        _current_trace_var.reset(self._trace_token)
+        request_id_var.reset(self._token)
+        return False
+
+    @contextmanager
+    def span(self, name):
+        """记录一个步骤的开始时间 (相对请求开始) 和耗时，单位毫秒。"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            finished = time.perf_counter()
+            self.spans.append({
+                "name": name,
+                "start_ms": round((started - self._start) * 1000, 1),
+                "duration_ms": round((finished - started) * 1000, 1),
+            })
+
+    def set(self, key, value):
+        """给这次 trace 附加额外信息 (例如检索到的文档数量)。"""
+        self.attributes[key] = value
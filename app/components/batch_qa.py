@@ -0,0 +1,187 @@
+# app/components/batch_qa.py
+# 目标：把一个 JSONL 文件里的大量问题一次性跑完。
+# 所有问题先做一次批量嵌入、一次 FAISS 多查询检索，然后并发调用 LLM 作答，
+# 每完成一条就立即产出一条结果（带参考来源和耗时）。
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from app.components.retriever import (
+    create_qa_chain,
+    embed_questions,
+    search_by_vectors,
+    answer_from_docs,
+)
+from app.common.logger import get_logger, set_console_stream
+from app.common.custom_exception import CustomException
+from app.config.config import BATCH_CONCURRENCY, BATCH_MAX_CONCURRENCY
+
+logger = get_logger(__name__)
+
+
+def load_questions(lines):
+    """
+    解析 JSONL 内容，返回 [{"id": ..., "question": ...}, ...]。
+    每行可以是 {"id": ..., "question": ...} 对象（id 可省略，默认使用行号），也可以直接是一个 JSON 字符串。
+    lines 可以是 str 或 UTF-8 编码的 bytes；解析失败时抛出 CustomException。
+    """
+    items = []
+    for line_number, line in enumerate(lines, start=1):
+        if isinstance(line, bytes):
+            try:
+                line = line.decode("utf-8")
+            except UnicodeDecodeError as e:
+                raise CustomException(f"Line {line_number} is not valid UTF-8", e)
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise CustomException(f"Invalid JSON on line {line_number}", e)
+
+        if isinstance(record, str):
+            record = {"question": record}
+        question = record.get("question") if isinstance(record, dict) else None
+        if not question or not isinstance(question, str):
+            raise CustomException(f"Line {line_number} has no 'question' field.")
+        items.append({"id": record.get("id", line_number), "question": question})
+    return items
+
+
+def _format_sources(hits):
+    return [
+        {
+            "source": doc.metadata.get("source", "N/A"),
+            "page": doc.metadata.get("page"),
+            "score": round(score, 4),
+        }
+        for doc, score in hits
+    ]
+
+
+def retrieve_batch(qa_chain, items):
+    """
+    对整批问题做一次批量嵌入和一次 FAISS 多查询检索。
+    返回 (每个问题的 [(doc, score), ...] 列表, 整批共享的耗时)。出错时直接抛出异常，由调用方处理。
+    """
+    questions = [item["question"] for item in items]
+    started = time.perf_counter()
+
+    logger.info(f"Embedding {len(questions)} questions in one batch...")
+    vectors = embed_questions(qa_chain, questions)
+    embed_done = time.perf_counter()
+
+    all_hits = search_by_vectors(qa_chain, vectors)
+    search_done = time.perf_counter()
+    logger.info("Batch retrieval finished.")
+
+    timings = {
+        "batch_embed": round((embed_done - started) * 1000, 1),
+        "batch_search": round((search_done - embed_done) * 1000, 1),
+    }
+    return all_hits, timings
+
+
+def run_batch(qa_chain, items, concurrency=BATCH_CONCURRENCY, retrieval=None):
+    """
+    批量回答 items 中的问题，按完成顺序逐条 yield 结果字典。
+    embed / search 是整批共享的一次调用，所以每条结果里记录的是整批的耗时 (batch_embed / batch_search)。
+    retrieval 可传入 retrieve_batch() 的结果，以便调用方在开始输出之前完成检索并处理检索错误。
+    """
+    if not items:
+        return
+    concurrency = max(1, min(int(concurrency), BATCH_MAX_CONCURRENCY))
+    all_hits, shared_timings = retrieval or retrieve_batch(qa_chain, items)
+    retrieval_ms = shared_timings["batch_embed"] + shared_timings["batch_search"]
+    answer_start = time.perf_counter()
+    logger.info(f"Answering {len(items)} questions with concurrency={concurrency}...")
+
+    def answer_one(item, hits):
+        started = time.perf_counter()
+        result = {
+            "id": item["id"],
+            "question": item["question"],
+            "answer": None,
+            "sources": _format_sources(hits),
+            "error": None,
+        }
+        try:
+            result["answer"] = answer_from_docs(qa_chain, item["question"], [doc for doc, _ in hits])
+        except Exception as e:
+            error_message = CustomException(f"Error answering question {item['id']}", e)
+            logger.error(str(error_message))
+            result["error"] = str(e)
+        finished = time.perf_counter()
+        result["timings_ms"] = {
+            **shared_timings,
+            "answer": round((finished - started) * 1000, 1),
+            "total": round(retrieval_ms + (finished - answer_start) * 1000, 1),
+        }
+        return result
+
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="batch-qa")
+    try:
+        futures = [executor.submit(answer_one, item, hits) for item, hits in zip(items, all_hits)]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        # 调用方提前停止迭代（例如 HTTP 客户端断开）时，取消还没开始的任务
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions in batch.")
+    parser.add_argument("input", help="JSONL file, one {\"id\": ..., \"question\": ...} per line")
+    parser.add_argument("-o", "--output", help="where to write JSONL results (default: stdout)")
+    parser.add_argument("-c", "--concurrency", type=int, default=BATCH_CONCURRENCY,
+                        help=f"max concurrent LLM calls (default: {BATCH_CONCURRENCY})")
+    args = parser.parse_args(argv)
+
+    # 结果可能写到 stdout，日志改走 stderr，保证输出是合法的 JSONL
+    set_console_stream(sys.stderr)
+
+    try:
+        # 以二进制方式读取，由 load_questions 逐行解码，非 UTF-8 的行能报告出行号
+        with open(args.input, "rb") as f:
+            items = load_questions(f)
+    except (OSError, CustomException) as e:
+        logger.error(f"Could not read questions from {args.input}: {e}")
+        return 1
+    if not items:
+        logger.error(f"No questions found in {args.input}.")
+        return 1
+    logger.info(f"Loaded {len(items)} questions from {args.input}")
+
+    qa_chain = create_qa_chain()
+    if qa_chain is None:
+        logger.error("Could not load QA chain, aborting batch run.")
+        return 1
+
+    try:
+        retrieval = retrieve_batch(qa_chain, items)
+    except Exception as e:
+        logger.error(str(CustomException("Batch retrieval failed", e)))
+        return 1
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    failed = 0
+    try:
+        for result in run_batch(qa_chain, items, args.concurrency, retrieval=retrieval):
+            if result["error"]:
+                failed += 1
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    logger.info(f"Batch finished: {len(items) - failed} answered, {failed} failed.")
+    return 0 if failed == 0 else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
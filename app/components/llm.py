@@ -4,6 +4,16 @@ import os
 from langchain_openai import ChatOpenAI
 from app.common.logger import get_logger
 from app.common.custom_exception import CustomException
+from app.common.hedging import Hedger
+from app.common.tracing import get_current_trace
+from app.config.config import (
+    LLM_HEDGE_ENABLED,
+    LLM_HEDGE_PERCENTILE,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_HEDGE_WINDOW,
+    LLM_HEDGE_BUDGET_RATIO,
+    LLM_HEDGE_BUDGET_BURST,
+)
 from dotenv import load_dotenv # 引入 load_dotenv 以便直接测试
 
 logger = get_logger(__name__)
@@ -15,6 +25,24 @@ LLM_API_KEY = os.getenv("LLM_API_KEY")
 LLM_BASE_URL = os.getenv("LLM_BASE_URL") # 例如: "https://api.deepseek.com"
 LLM_MODEL_NAME = os.getenv("LLM_MODEL_NAME", "deepseek-chat") # 默认使用 deepseek-chat 模型
 
+# 对冲请求是可选的：开启后，慢的 LLM 调用会被重复发送一次，先返回的结果胜出。
+# 改写问题和最终作答的延迟分布差别很大，所以各用一个 Hedger，分别统计延迟百分位。
+def _make_hedger(name):
+    if not LLM_HEDGE_ENABLED:
+        return None
+    return Hedger(
+        name,
+        percentile=LLM_HEDGE_PERCENTILE,
+        min_samples=LLM_HEDGE_MIN_SAMPLES,
+        window=LLM_HEDGE_WINDOW,
+        budget_ratio=LLM_HEDGE_BUDGET_RATIO,
+        budget_burst=LLM_HEDGE_BUDGET_BURST,
+    )
+
+
+condense_hedger = _make_hedger("condense")
+answer_hedger = _make_hedger("answer")
+
 def load_llm():
     """
     通过连接到云端 LLM API 来初始化 LLM。
@@ -43,6 +71,25 @@ def load_llm():
         error_message = CustomException(f"Error initializing Cloud LLM: {str(e)}")
         logger.error(error_message)
         return None
+
+
+def invoke_llm_chain(chain, inputs, hedger=None):
+    """
+    调用一个依赖远程 LLM 的链。传入 hedger (对冲已开启) 时通过 ainvoke 执行，
+    以便慢请求可以被对冲、落败的请求可以被真正取消；否则直接同步调用。
+    对冲的结果会记录到当前请求的 Trace 上 (<name>_hedged / <name>_hedge_won)。
+    """
+    if hedger is None:
+        return chain.invoke(inputs)
+
+    result, hedge_info = hedger.run(lambda: chain.ainvoke(inputs))
+    trace = get_current_trace()
+    if trace and hedge_info["hedged"]:
+        trace.set(f"{hedger.name}_hedged", True)
+        trace.set(f"{hedger.name}_hedge_won", hedge_info["hedge_won"])
+    return result
+
+
 if __name__ == "__main__":
     # 直接运行此文件时，测试 LLM 初始化
     llm = load_llm()
@@ -5,14 +5,18 @@
 # 从 langchain_core.prompts 库中，导入 PromptTemplate 这个“指令模板”工具
 # 导入我们自己写的“LLM加载器” (load_llm) 和“向量数据库加载器” (load_vector_store)
 # 导入日志、自定义错误和配置文件等
+import faiss
+import numpy as np
+from contextlib import nullcontext
 from langchain.chains import RetrievalQA,ConversationalRetrievalChain
+from langchain.chains.conversational_retrieval.base import _get_chat_history
 
 from langchain_core.prompts import PromptTemplate
-from app.components.llm import load_llm
+from app.components.llm import load_llm, invoke_llm_chain, condense_hedger, answer_hedger
 from app.components.vetor_store import load_vector_store
 from app.common.logger import get_logger
 from app.common.custom_exception import CustomException
-from app.config.config import HUGGINGFACE_REPO_ID,HF_TOKEN
+from app.config.config import HUGGINGFACE_REPO_ID,HF_TOKEN,RETRIEVER_K,RETRIEVER_SCORE_THRESHOLD
 logger = get_logger(__name__)
 # === 步骤2：设计给AI的“考试指令” (Prompt Template) ===
 # 定义一个多行字符串，作为我们的指令模板。
@@ -76,7 +80,7 @@ def create_qa_chain():
             llm=llm,
             retriever=db.as_retriever(
                 search_type="similarity_score_threshold",
-                search_kwargs={'score_threshold': 0.5, 'k': 3}
+                search_kwargs={'score_threshold': RETRIEVER_SCORE_THRESHOLD, 'k': RETRIEVER_K}
             ),
             # 关键：使用 combine_docs_chain_kwargs 来传递自定义 Prompt
             combine_docs_chain_kwargs={'prompt': set_custom_prompt()},
@@ -97,4 +101,94 @@ def create_qa_chain():
         error_message = CustomException(f"Error creating QA chain: {str(e)}")
         logger.error(str(error_message))
         # ...明确地返回 None，表示创建失败
-        return None
\ No newline at end of file
+        return None
+
+# 目标：把问答链拆成几个可以单独调用的步骤，供批量问答等场景使用。
+# 这些函数直接复用 create_qa_chain() 组装好的检索参数和 Prompt，保证结果与逐条提问一致。
+
+def condense_question(qa_chain, question, chat_history):
+    """有对话历史时，用问答链的 question_generator 把追问改写成一个独立的问题；没有历史时原样返回。"""
+    get_chat_history = qa_chain.get_chat_history or _get_chat_history
+    chat_history_str = get_chat_history(chat_history)
+    if not chat_history_str:
+        return question
+    response = invoke_llm_chain(qa_chain.question_generator, {
+        "question": question,
+        "chat_history": chat_history_str,
+    }, hedger=condense_hedger)
+    return response["text"]
+
+
+def embed_questions(qa_chain, questions):
+    """一次性批量计算所有问题的向量，返回 shape 为 (n, dim) 的 float32 矩阵。"""
+    db = qa_chain.retriever.vectorstore
+    vectors = db.embeddings.embed_documents(list(questions))
+    return np.asarray(vectors, dtype=np.float32)
+
+
+def search_by_vectors(qa_chain, vectors):
+    """
+    用一次 FAISS 多查询调用检索所有向量，返回每个问题的 [(doc, score), ...] 列表。
+    score 与 similarity_score_threshold 检索器使用的相关度分数相同，低于阈值的结果会被过滤掉。
+    """
+    retriever = qa_chain.retriever
+    db = retriever.vectorstore
+    k = retriever.search_kwargs.get("k", RETRIEVER_K)
+    score_threshold = retriever.search_kwargs.get("score_threshold")
+
+    vectors = np.array(vectors, dtype=np.float32)
+    if db._normalize_L2:
+        faiss.normalize_L2(vectors)
+    distances, indices = db.index.search(vectors, k)
+    relevance_score_fn = db._select_relevance_score_fn()
+
+    results = []
+    for row_distances, row_indices in zip(distances, indices):
+        hits = []
+        for distance, idx in zip(row_distances, row_indices):
+            # FAISS 在结果不足 k 个时用 -1 填充
+            if idx == -1:
+                continue
+            score = relevance_score_fn(float(distance))
+            if score_threshold is not None and score < score_threshold:
+                continue
+            doc = db.docstore.search(db.index_to_docstore_id[idx])
+            hits.append((doc, score))
+        results.append(hits)
+    return results
+
+
+def answer_from_docs(qa_chain, question, docs):
+    """用问答链里的“stuff”文档链和自定义 Prompt，根据检索到的文档回答问题。"""
+    response = invoke_llm_chain(qa_chain.combine_docs_chain, {
+        "input_documents": docs,
+        "question": question,
+    }, hedger=answer_hedger)
+    return response["output_text"]
+
+
+def answer_question(qa_chain, question, chat_history, trace=None):
+    """
+    按 ConversationalRetrievalChain 的流程回答一轮对话 (改写问题 -> 嵌入 -> 检索 -> 作答)，
+    如果传入 trace (app.common.tracing.Trace)，每个步骤的耗时都会记录为一个 span。
+    返回格式与 qa_chain.invoke() 相同：{"answer", "source_documents", "generated_question"}。
+    """
+    span = trace.span if trace else (lambda name: nullcontext())
+
+    with span("condense"):
+        new_question = condense_question(qa_chain, question, chat_history)
+    with span("embed"):
+        vectors = embed_questions(qa_chain, [new_question])
+    with span("search"):
+        hits = search_by_vectors(qa_chain, vectors)[0]
+    docs = [doc for doc, _ in hits]
+    with span("answer"):
+        answer = answer_from_docs(qa_chain, new_question, docs)
+
+    if trace:
+        trace.set("num_docs", len(docs))
+    return {
+        "answer": answer,
+        "source_documents": docs,
+        "generated_question": new_question,
+    }
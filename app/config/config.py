@@ -6,4 +6,56 @@ HUGGINGFACE_REPO_ID="google/gemma-1.1-7b-it"
 DB_FAISS_PATH="vectorstore/db_faiss"
 DATA_PATH = "./data"  # 相对于项目根目录的路径
 CHUNK_SIZE=500
-CHUNK_OVERLAP=50
\ No newline at end of file
+CHUNK_OVERLAP=50
+
+# 检索参数 (问答链与批量问答共用)
+RETRIEVER_K = 3
+RETRIEVER_SCORE_THRESHOLD = 0.5
+
+# 批量问答: 同时进行的 LLM 调用数量
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "4"))
+BATCH_MAX_CONCURRENCY = 16
+
+# 生产服务 (gunicorn preload + fork): worker 进程数和每个 worker 的线程数
+SERVER_BIND = os.environ.get("SERVER_BIND", "0.0.0.0:5000")
+SERVER_WORKERS = int(os.environ.get("SERVER_WORKERS", "2"))
+SERVER_THREADS = int(os.environ.get("SERVER_THREADS", "4"))
+SERVER_TIMEOUT = int(os.environ.get("SERVER_TIMEOUT", "120"))
+
+# 日志: 异步队列 + JSON 文件 (按天且按大小轮转)
+# 配置值不合法时回退到默认值，并把提示放进 LOG_CONFIG_WARNINGS，由日志模块初始化后输出
+LOG_CONFIG_WARNINGS = []
+
+
+def _log_sample_rate(env_name, default):
+    value = int(os.environ.get(env_name, str(default)))
+    if value < 1:
+        LOG_CONFIG_WARNINGS.append(f"{env_name}={value} is invalid (must be >= 1), using 1 (log every event).")
+        return 1
+    return value
+
+
+LOG_DIR = os.environ.get("LOG_DIR", "logs")
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+if LOG_LEVEL not in ("DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"):
+    LOG_CONFIG_WARNINGS.append(f"Unknown LOG_LEVEL={LOG_LEVEL!r}, using INFO.")
+    LOG_LEVEL = "INFO"
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", "14"))
+LOG_QUEUE_SIZE = 10000
+# 高频事件的采样率: 每 N 条只记录 1 条 (WARNING 及以上级别始终记录)
+LOG_SAMPLE_RATES = {
+    "health": _log_sample_rate("LOG_HEALTH_SAMPLE_EVERY", 100),
+}
+
+# 请求合并: 没有对话历史、规范化后相同的问题在执行期间共享同一次检索和回答
+COALESCE_ENABLED = os.environ.get("COALESCE_ENABLED", "true").lower() in ["true", "1", "yes"]
+
+# LLM 对冲请求: 调用超过最近延迟的 p<LLM_HEDGE_PERCENTILE> 时再发一次，先返回者胜出
+LLM_HEDGE_ENABLED = os.environ.get("LLM_HEDGE_ENABLED", "false").lower() in ["true", "1", "yes"]
+LLM_HEDGE_PERCENTILE = float(os.environ.get("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = 20
+LLM_HEDGE_WINDOW = 200
+# 预算: 对冲请求最多占上游调用量的 LLM_HEDGE_BUDGET_RATIO
+LLM_HEDGE_BUDGET_RATIO = float(os.environ.get("LLM_HEDGE_BUDGET_RATIO", "0.1"))
+LLM_HEDGE_BUDGET_BURST = 5
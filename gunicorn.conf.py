@@ -0,0 +1,54 @@
+# gunicorn.conf.py
+# 生产环境服务配置：python -m gunicorn -c gunicorn.conf.py app.application:app
+# (用 python -m 启动，保证项目根目录在 sys.path 中，下面才能导入 app.config)
+#
+# preload_app=True 让 master 进程只加载一次嵌入模型和 FAISS 向量库 (create_qa_chain)，
+# 之后 fork 出的 worker 通过写时复制 (copy-on-write) 共享这些只读内存页，
+# 内存占用不会随 worker 数量成倍增长。
+# (preload 还保证所有 worker 使用同一个 app.secret_key，session 在 worker 之间通用。)
+
+import gc
+import os
+
+from app.config.config import SERVER_BIND, SERVER_WORKERS, SERVER_THREADS, SERVER_TIMEOUT
+
+bind = SERVER_BIND
+workers = SERVER_WORKERS
+threads = SERVER_THREADS
+worker_class = "gthread"
+timeout = SERVER_TIMEOUT
+preload_app = True
+
+# 加载模型期间关闭 GC：避免循环回收在对象之间留下空洞，导致 fork 后的页面布局更分散。
+gc.disable()
+
+
+def when_ready(server):
+    # 应用已经在 master 中加载完毕。把当前所有对象移到 GC 的永久代，
+    # worker 中的垃圾回收就不会再遍历 (并写入) 这些对象的 GC 头，
+    # 从而避免共享页面因为 GC 而被复制。
+    os.environ["SERVER_MASTER_PID"] = str(os.getpid())
+    gc.freeze()
+    server.log.info(f"Froze {gc.get_freeze_count()} objects before forking {workers} workers x {threads} threads")
+
+
+def pre_fork(server, worker):
+    # worker 异常退出后 master 会重新 fork，确保期间新产生的对象也被冻结
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    # worker 中重新开启 GC，只回收 fork 之后新建的对象
+    gc.enable()
+
+
+def post_worker_init(worker):
+    from app.common.memory import get_process_memory
+
+    memory = get_process_memory()
+    if not memory:
+        return
+    worker.log.info(
+        f"Worker {worker.pid} ready: rss={memory['rss_mb']}MB "
+        f"shared={memory['shared_mb']}MB private={memory['private_mb']}MB"
+    )
@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# 测试中导入的模块会初始化日志，把日志文件写到临时目录，而不是项目根目录下的 logs/
+os.environ.setdefault("LOG_DIR", tempfile.mkdtemp(prefix="rag-chatbot-test-logs-"))
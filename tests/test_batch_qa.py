@@ -0,0 +1,102 @@
+import importlib
+import json
+import os
+import subprocess
+import sys
+import types
+
+import pytest
+
+from app.common.custom_exception import CustomException
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 用一个假的检索模块代替 app.components.retriever，测试不需要加载嵌入模型、FAISS 和 LLM
+FAKE_RETRIEVER = '''
+class _Doc:
+    def __init__(self, source):
+        self.metadata = {"source": source, "page": 1}
+
+def create_qa_chain():
+    return object()
+
+def embed_questions(qa_chain, questions):
+    return [[0.0] for _ in questions]
+
+def search_by_vectors(qa_chain, vectors):
+    return [[(_Doc("guide.pdf"), 0.9)] for _ in vectors]
+
+def answer_from_docs(qa_chain, question, docs):
+    return f"answer to {question}"
+'''
+
+DRIVER = '''
+import sys, types
+fake = types.ModuleType("app.components.retriever")
+exec(FAKE_RETRIEVER, fake.__dict__)
+sys.modules["app.components.retriever"] = fake
+from app.components import batch_qa
+sys.exit(batch_qa.main(sys.argv[1:]))
+'''
+
+
+@pytest.fixture
+def batch_qa(monkeypatch):
+    fake = types.ModuleType("app.components.retriever")
+    exec(FAKE_RETRIEVER, fake.__dict__)
+    monkeypatch.setitem(sys.modules, "app.components.retriever", fake)
+    monkeypatch.delitem(sys.modules, "app.components.batch_qa", raising=False)
+    return importlib.import_module("app.components.batch_qa")
+
+
+def _run_cli(tmp_path, *args):
+    driver = tmp_path / "driver.py"
+    driver.write_text(f"FAKE_RETRIEVER = {FAKE_RETRIEVER!r}\n{DRIVER}", encoding="utf-8")
+    env = {**os.environ, "PYTHONPATH": REPO_ROOT, "LOG_DIR": str(tmp_path / "logs")}
+    return subprocess.run(
+        [sys.executable, str(driver), *args],
+        cwd=tmp_path, env=env, capture_output=True, text=True, timeout=60,
+    )
+
+
+def test_cli_stdout_is_valid_jsonl(tmp_path):
+    questions = tmp_path / "q.jsonl"
+    questions.write_text(
+        "\n".join(json.dumps({"id": i, "question": f"问题 {i}"}, ensure_ascii=False) for i in range(20)),
+        encoding="utf-8",
+    )
+
+    proc = _run_cli(tmp_path, str(questions), "-c", "4")
+
+    assert proc.returncode == 0, proc.stderr
+    results = [json.loads(line) for line in proc.stdout.splitlines()]
+    assert sorted(r["id"] for r in results) == list(range(20))
+    assert all(r["answer"] == f"answer to {r['question']}" for r in results)
+    # 日志仍然输出，只是走 stderr
+    assert "Batch finished" in proc.stderr
+
+
+def test_cli_rejects_empty_and_non_utf8_input(tmp_path):
+    empty = tmp_path / "empty.jsonl"
+    empty.write_text("\n", encoding="utf-8")
+    proc = _run_cli(tmp_path, str(empty))
+    assert proc.returncode == 1
+    assert "No questions found" in proc.stderr
+    assert "Traceback" not in proc.stderr
+
+    latin1 = tmp_path / "latin1.jsonl"
+    latin1.write_bytes('{"question": "ok"}\n{"question": "café"}\n'.encode("latin-1"))
+    proc = _run_cli(tmp_path, str(latin1))
+    assert proc.returncode == 1
+    assert "Line 2 is not valid UTF-8" in proc.stderr
+    assert "Traceback" not in proc.stderr
+
+
+def test_load_questions(batch_qa):
+    items = batch_qa.load_questions([b'{"id": "a", "question": "x"}', b"", '"y"'])
+    assert items == [{"id": "a", "question": "x"}, {"id": 3, "question": "y"}]
+
+    with pytest.raises(CustomException, match="Line 1 is not valid UTF-8"):
+        batch_qa.load_questions([b"\xff\xfe"])
+    with pytest.raises(CustomException, match="no 'question' field"):
+        batch_qa.load_questions(['{"id": 1}'])
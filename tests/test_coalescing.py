@@ -0,0 +1,95 @@
+import threading
+import time
+
+import pytest
+
+from app.common.coalescing import RequestCoalescer, normalize_question
+
+
+def _wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached in time"
+        time.sleep(0.005)
+
+
+def _run_concurrently(coalescer, fn, followers=4):
+    """先让领头请求进入 fn，再启动 followers 个相同 key 的请求，返回各自的 (结果或异常, leader_id)。"""
+    release = threading.Event()
+    outcomes = {}
+
+    def blocking_fn():
+        release.wait(2)
+        return fn()
+
+    def call(request_id):
+        try:
+            outcomes[request_id] = coalescer.run("flu", blocking_fn, request_id)
+        except Exception as e:
+            outcomes[request_id] = (e, None)
+
+    threads = [threading.Thread(target=call, args=("leader",))]
+    threads[0].start()
+    _wait_until(lambda: coalescer.stats()["in_flight"] == 1)
+    for i in range(followers):
+        thread = threading.Thread(target=call, args=(f"follower-{i}",))
+        threads.append(thread)
+        thread.start()
+    _wait_until(lambda: coalescer.stats()["coalesced"] == followers)
+    release.set()
+    for thread in threads:
+        thread.join(2)
+    return outcomes
+
+
+def test_followers_share_leader_result():
+    coalescer = RequestCoalescer()
+    calls = []
+
+    def answer():
+        calls.append(1)
+        return {"answer": "rest"}
+
+    outcomes = _run_concurrently(coalescer, answer)
+
+    assert len(calls) == 1
+    assert outcomes["leader"] == ({"answer": "rest"}, None)
+    for i in range(4):
+        result, leader_id = outcomes[f"follower-{i}"]
+        assert result is outcomes["leader"][0]
+        assert leader_id == "leader"
+    assert coalescer.stats() == {"executed": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_followers_receive_leader_exception():
+    coalescer = RequestCoalescer()
+
+    def fail():
+        raise ValueError("upstream down")
+
+    outcomes = _run_concurrently(coalescer, fail, followers=2)
+
+    errors = [error for error, _ in outcomes.values()]
+    assert len(errors) == 3
+    assert all(isinstance(error, ValueError) and str(error) == "upstream down" for error in errors)
+    assert coalescer.stats()["in_flight"] == 0
+
+    # key 已释放，下一次调用会重新执行
+    assert coalescer.run("flu", lambda: "ok", "next") == ("ok", None)
+
+
+def test_sequential_calls_are_not_coalesced():
+    coalescer = RequestCoalescer()
+    assert coalescer.run("q", lambda: 1, "a") == (1, None)
+    assert coalescer.run("q", lambda: 2, "b") == (2, None)
+    assert coalescer.stats() == {"executed": 2, "coalesced": 0, "in_flight": 0}
+
+
+@pytest.mark.parametrize("raw, expected", [
+    ("ＦＬＵ　是什么？", "flu 是什么"),
+    ("  What is   the flu?? ", "what is the flu"),
+    ("如何治疗感冒。", "如何治疗感冒"),
+    ("Ｃ１２３！", "c123"),
+])
+def test_normalize_question(raw, expected):
+    assert normalize_question(raw) == expected
@@ -0,0 +1,131 @@
+import asyncio
+import time
+
+import pytest
+
+from app.common.hedging import Hedger
+
+FAST = 0.01
+SLOW = 2.0
+
+
+class Upstream:
+    """按顺序返回预设耗时 (或异常) 的假上游调用，并记录被取消的调用。"""
+
+    def __init__(self, *behaviours):
+        self.behaviours = list(behaviours)
+        self.started = 0
+        self.cancelled = []
+
+    def __call__(self):
+        index = self.started
+        self.started += 1
+        behaviour = self.behaviours[index] if index < len(self.behaviours) else FAST
+        return self._call(index, behaviour)
+
+    async def _call(self, index, behaviour):
+        delay, error = behaviour if isinstance(behaviour, tuple) else (behaviour, None)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled.append(index)
+            raise
+        if error:
+            raise error
+        return index
+
+
+def _warm_up(hedger, calls):
+    upstream = Upstream()
+    for _ in range(calls):
+        hedger.run(upstream)
+
+
+def _wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached in time"
+        time.sleep(0.005)
+
+
+def test_no_hedge_before_min_samples():
+    hedger = Hedger("test", min_samples=3)
+    _warm_up(hedger, 2)
+
+    upstream = Upstream(0.2)
+    result, info = hedger.run(upstream)
+
+    assert (result, info) == (0, {"hedged": False, "hedge_won": False})
+    assert upstream.started == 1
+    assert hedger.stats()["hedged"] == 0
+
+
+def test_slow_primary_is_hedged_and_loser_cancelled():
+    hedger = Hedger("test", min_samples=3)
+    _warm_up(hedger, 3)
+    trigger = hedger.hedge_delay()
+
+    upstream = Upstream(SLOW, FAST)
+    started = time.perf_counter()
+    result, info = hedger.run(upstream)
+
+    assert time.perf_counter() - started < SLOW / 2
+    assert result == 1
+    assert info == {"hedged": True, "hedge_won": True}
+    _wait_until(lambda: upstream.cancelled == [0])
+    stats = hedger.stats()
+    assert (stats["hedged"], stats["hedge_wins"]) == (1, 1)
+    # 记录的延迟从主请求发出算起，所以不会低于触发对冲的阈值
+    assert hedger._latencies[-1] >= trigger
+
+
+def test_hedge_limited_by_budget():
+    hedger = Hedger("test", min_samples=3, budget_ratio=0, budget_burst=1)
+    _warm_up(hedger, 3)
+
+    _, first = hedger.run(Upstream(SLOW, FAST))
+    upstream = Upstream(0.2)
+    result, second = hedger.run(upstream)
+
+    assert first["hedged"] is True
+    assert second == {"hedged": False, "hedge_won": False}
+    assert result == 0 and upstream.started == 1
+    stats = hedger.stats()
+    assert (stats["hedged"], stats["budget_exhausted"]) == (1, 1)
+
+
+def test_primary_wins_when_it_finishes_first_after_hedge():
+    hedger = Hedger("test", min_samples=3)
+    _warm_up(hedger, 3)
+
+    upstream = Upstream(0.1, SLOW)
+    result, info = hedger.run(upstream)
+
+    assert result == 0
+    assert info == {"hedged": True, "hedge_won": False}
+    _wait_until(lambda: upstream.cancelled == [1])
+
+
+def test_both_failing_raises_primary_error():
+    hedger = Hedger("test", min_samples=3)
+    _warm_up(hedger, 3)
+
+    upstream = Upstream((0.2, ValueError("primary")), (FAST, RuntimeError("hedge")))
+    with pytest.raises(ValueError, match="primary"):
+        hedger.run(upstream)
+    assert upstream.started == 2
+
+
+def test_hedge_error_falls_back_to_primary_result():
+    hedger = Hedger("test", min_samples=3)
+    _warm_up(hedger, 3)
+
+    result, info = hedger.run(Upstream(0.2, (FAST, RuntimeError("hedge"))))
+    assert result == 0
+    assert info == {"hedged": True, "hedge_won": False}
+
+
+def test_primary_error_without_hedge_is_raised():
+    hedger = Hedger("test", min_samples=3)
+    with pytest.raises(ValueError, match="boom"):
+        hedger.run(Upstream((FAST, ValueError("boom"))))
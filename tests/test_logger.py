@@ -0,0 +1,113 @@
+import importlib
+import json
+import logging
+import os
+import queue
+import re
+
+from app.common.logger import JsonFormatter, NonBlockingQueueHandler, SamplingFilter, SizedTimedRotatingFileHandler
+from app.config import config
+
+
+def _write_records(handler, count):
+    for i in range(count):
+        record = logging.LogRecord("test", logging.INFO, __file__, 0, f"msg {i:03d}", (), None)
+        handler.handle(record)
+    handler.close()
+
+
+def _messages(path):
+    with open(path, encoding="utf-8") as f:
+        return re.findall(r"msg \d{3}", f.read())
+
+
+def test_size_rotation_keeps_newest_backups(tmp_path):
+    log_file = tmp_path / "app.log"
+    handler = SizedTimedRotatingFileHandler(str(log_file), max_bytes=20, when="midnight", backupCount=2)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    _write_records(handler, 12)
+
+    backups = sorted(name for name in os.listdir(tmp_path) if name != "app.log")
+    assert len(backups) == 2
+    assert all(re.fullmatch(r"app\.log\.\d{4}-\d{2}-\d{2}\.[12]", name) for name in backups)
+
+    newest, older = (tmp_path / name for name in sorted(backups, key=lambda name: name[-1]))
+    # 当前文件和两个备份正好是最后写入的 6 条记录，没有中间缺口
+    assert _messages(older) + _messages(newest) + _messages(log_file) == [f"msg {i:03d}" for i in range(6, 12)]
+
+
+def test_size_rotation_orders_backups_numerically(tmp_path):
+    log_file = tmp_path / "app.log"
+    handler = SizedTimedRotatingFileHandler(str(log_file), max_bytes=10, when="midnight", backupCount=11)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    _write_records(handler, 13)
+
+    # 超过 10 个备份时，被删除的应该是序号最大 (最旧) 的文件，而不是按字符串排序排在最后的 .9
+    indexes = sorted(int(name.rsplit(".", 1)[1]) for name in os.listdir(tmp_path) if name != "app.log")
+    assert indexes == list(range(1, 12))
+    assert _messages(tmp_path / next(name for name in os.listdir(tmp_path) if name.endswith(".11"))) == ["msg 001"]
+    assert _messages(log_file) == ["msg 012"]
+
+
+def test_queue_handler_keeps_exception_as_separate_json_field():
+    log_queue = queue.Queue()
+    logger = logging.getLogger("test.exception")
+    logger.propagate = False
+    handler = NonBlockingQueueHandler(log_queue)
+    logger.addHandler(handler)
+    try:
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            logger.exception("failed for %s", "user")
+    finally:
+        logger.removeHandler(handler)
+
+    record = log_queue.get_nowait()
+    assert record.exc_info is None
+    payload = json.loads(JsonFormatter().format(record))
+    assert payload["message"] == "failed for user"
+    assert "ZeroDivisionError" in payload["exception"]
+    # 控制台的文本格式仍然会输出堆栈
+    assert "ZeroDivisionError" in logging.Formatter("%(message)s").format(record)
+
+
+def test_queue_handler_counts_dropped_records():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=1))
+    for i in range(3):
+        handler.handle(logging.LogRecord("test", logging.INFO, __file__, 0, f"msg {i}", (), None))
+    assert handler.dropped == 2
+
+
+def test_sampling_filter_keeps_every_nth_and_all_warnings():
+    sampling = SamplingFilter({"health": 3})
+
+    def record(level, sample="health"):
+        r = logging.LogRecord("test", level, __file__, 0, "probe", (), None)
+        r.sample = sample
+        return r
+
+    kept = [sampling.filter(record(logging.INFO)) for _ in range(6)]
+    assert kept == [True, False, False, True, False, False]
+    assert sampling.filter(record(logging.WARNING))
+    assert sampling.filter(record(logging.INFO, sample="other"))
+
+
+def test_invalid_log_config_falls_back_with_warnings(monkeypatch):
+    monkeypatch.setenv("LOG_LEVEL", "verbose")
+    monkeypatch.setenv("LOG_HEALTH_SAMPLE_EVERY", "0")
+    try:
+        reloaded = importlib.reload(config)
+        assert reloaded.LOG_LEVEL == "INFO"
+        assert reloaded.LOG_SAMPLE_RATES["health"] == 1
+        assert len(reloaded.LOG_CONFIG_WARNINGS) == 2
+    finally:
+        monkeypatch.undo()
+        importlib.reload(config)
+
+    monkeypatch.setenv("LOG_LEVEL", "debug")
+    try:
+        assert importlib.reload(config).LOG_LEVEL == "DEBUG"
+    finally:
+        monkeypatch.undo()
+        importlib.reload(config)